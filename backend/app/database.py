@@ -9,8 +9,18 @@ engine = create_async_engine(
     settings.database_url,
     pool_size=settings.database_pool_size,
     max_overflow=settings.database_max_overflow,
-    pool_pre_ping=True,
+    # No pre-ping: its probe opens a transaction that PgBouncer (transaction
+    # pooling) leaves "idle in transaction". Recycle + TCP keepalives instead.
+    pool_pre_ping=False,
+    pool_recycle=settings.database_pool_recycle,
     echo=settings.debug,
+    connect_args={
+        "server_settings": {
+            "tcp_keepalives_idle": "30",
+            "tcp_keepalives_interval": "10",
+            "tcp_keepalives_count": "3",
+        }
+    },
 )
 
 AsyncSessionLocal = async_sessionmaker(
@@ -0,0 +1,53 @@
+# Shared asyncpg connection pools for the raw-SQL routers
+import asyncpg
+import logging
+from typing import Dict, Set
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Keyed by database name; created in the app lifespan
+pools: Dict[str, asyncpg.Pool] = {}
+
+# Optional catalog tables found in taxi_catalog at startup
+catalog_tables: Set[str] = set()
+
+
+# asyncpg takes plain postgresql:// DSNs; derived once from DATABASE_URL at import
+TAXI_DSN = settings.database_url.replace("+asyncpg", "")
+PAGILA_DSN = TAXI_DSN.replace("/taxi_catalog", "/pagila")
+DSNS: Dict[str, str] = {"taxi_catalog": TAXI_DSN, "pagila": PAGILA_DSN}
+
+
+async def create_pool(database_name: str) -> asyncpg.Pool:
+    """Create a pool; pooled connections keep asyncpg's prepared-statement cache warm.
+    conn.fetch() with a module-level query string is prepared once per connection and
+    re-executed from this cache; an explicit conn.prepare() would bypass it"""
+    return await asyncpg.create_pool(
+        DSNS[database_name],
+        min_size=settings.asyncpg_pool_min_size,
+        max_size=settings.asyncpg_pool_max_size,
+        max_inactive_connection_lifetime=300,
+        statement_cache_size=1024,
+    )
+
+
+async def init_pools():
+    """Create the catalog pool and, when the database exists, the pagila pool"""
+    pools["taxi_catalog"] = await create_pool("taxi_catalog")
+    async with pools["taxi_catalog"].acquire() as conn:
+        if await conn.fetchval("SELECT to_regclass('catalog.column_metadata') IS NOT NULL"):
+            catalog_tables.add("column_metadata")
+    try:
+        pools["pagila"] = await create_pool("pagila")
+    except Exception as e:
+        logger.warning(f"pagila database unavailable, lineage will use the catalog only: {str(e)}")
+
+
+async def close_pools():
+    """Close all pools"""
+    for pool in pools.values():
+        await pool.close()
+    pools.clear()
+    catalog_tables.clear()
@@ -1,11 +1,20 @@
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
 from typing import Dict, Any, Optional, List
 from pydantic import BaseModel
+import asyncio
+import orjson
+import shutil
 import tempfile
 import os
 from pathlib import Path
+from sqlalchemy import select, cast, bindparam, String
 import logging
 
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models import TableMetadata
+from app.routers.analytics import invalidate_analytics_cache
 from app.services.data_processor import data_processor
 from app.services.job_processor import job_processor
 
@@ -13,6 +22,21 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/data", tags=["data-processing"])
 
+# Built once at import so SQLAlchemy's compiled cache key is stable across requests.
+# Plain columns: rows come back as mappings, no ORM instances are built.
+# table_type is read as text so rows skip the ENUM -> TableType coercion.
+TABLES_STMT = select(
+    TableMetadata.id,
+    TableMetadata.schema_name,
+    TableMetadata.table_name,
+    cast(TableMetadata.table_type, String).label("table_type"),
+    TableMetadata.row_count,
+    TableMetadata.size_bytes,
+    TableMetadata.last_analyzed
+)
+TABLES_BY_SCHEMA_STMT = TABLES_STMT.where(TableMetadata.schema_name == bindparam("schema_name"))
+TABLES_STREAM_BATCH_SIZE = 500
+
 
 class DatasetUploadResponse(BaseModel):
     job_id: str
@@ -25,9 +49,9 @@ class JobStatusResponse(BaseModel):
     type: str
     status: str
     progress: float
-    created_at: str
-    started_at: Optional[str] = None
-    completed_at: Optional[str] = None
+    created_at: int  # epoch milliseconds
+    started_at: Optional[int] = None
+    completed_at: Optional[int] = None
     result: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
 
@@ -59,12 +83,26 @@ async def upload_dataset(
     if not table_name:
         table_name = Path(file.filename).stem
     
+    # Reject oversized uploads up front when the size is known
+    if file.size is not None and file.size > settings.max_upload_bytes:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File too large. Maximum size: {settings.max_upload_bytes} bytes"
+        )
+    
     try:
-        # Save uploaded file temporarily
+        # Copy the spooled upload to a temporary file off the event loop
         with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as temp_file:
-            content = await file.read()
-            temp_file.write(content)
             temp_file_path = temp_file.name
+            await asyncio.to_thread(shutil.copyfileobj, file.file, temp_file, settings.upload_chunk_size)
+            bytes_written = temp_file.tell()
+        
+        if bytes_written > settings.max_upload_bytes:
+            os.unlink(temp_file_path)
+            raise HTTPException(
+                status_code=413,
+                detail=f"File too large. Maximum size: {settings.max_upload_bytes} bytes"
+            )
         
         # Submit background job for processing
         job_data = {
@@ -82,6 +120,8 @@ async def upload_dataset(
             status="submitted"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error uploading dataset: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
@@ -155,32 +195,24 @@ async def get_dataset_profile(schema_name: str, table_name: str):
 async def list_tables(schema_name: Optional[str] = None):
     """List all available tables"""
     
-    from app.database import AsyncSessionLocal
-    from app.models import TableMetadata
-    from sqlalchemy import select
+    if schema_name:
+        stmt, params = TABLES_BY_SCHEMA_STMT, {"schema_name": schema_name}
+    else:
+        stmt, params = TABLES_STMT, None
     
-    async with AsyncSessionLocal() as session:
-        stmt = select(TableMetadata)
-        if schema_name:
-            stmt = stmt.where(TableMetadata.schema_name == schema_name)
-        
-        result = await session.execute(stmt)
-        tables = result.scalars().all()
-        
-        return {
-            "tables": [
-                {
-                    "id": str(table.id),
-                    "schema_name": table.schema_name,
-                    "table_name": table.table_name,
-                    "table_type": table.table_type.value,
-                    "row_count": table.row_count,
-                    "size_bytes": table.size_bytes,
-                    "last_analyzed": table.last_analyzed.isoformat() if table.last_analyzed else None
-                }
-                for table in tables
-            ]
-        }
+    async def stream_tables():
+        # Server-side cursor: rows are encoded and sent as they arrive
+        async with AsyncSessionLocal() as session:
+            result = await session.stream(stmt, params)
+            yield b'{"tables":['
+            separator = b""
+            async for rows in result.mappings().partitions(TABLES_STREAM_BATCH_SIZE):
+                # default=str covers asyncpg's UUID subclass, which orjson doesn't accept natively
+                yield separator + b",".join(orjson.dumps(dict(row), default=str) for row in rows)
+                separator = b","
+            yield b"]}"
+    
+    return StreamingResponse(stream_tables(), media_type="application/json")
 
 
 @router.get("/queue/stats")
@@ -219,6 +251,7 @@ async def process_dataset_handler(job_id: str, job_data: Dict[str, Any]) -> Dict
         result = await data_processor.process_dataset(file_path, schema_name, table_name)
         
         await job_processor.update_job_progress(job_id, 90, "Storing metadata")
+        await invalidate_analytics_cache()
         
         # Clean up temporary file
         try:
@@ -277,6 +310,7 @@ async def process_dataset_url_handler(job_id: str, job_data: Dict[str, Any]) ->
         
         # Process the dataset
         result = await data_processor.load_nyc_taxi_data(temp_file_path)
+        await invalidate_analytics_cache()
         
         # Clean up temporary file
         try:
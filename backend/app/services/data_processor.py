@@ -1,16 +1,200 @@
+import asyncio
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 from typing import Dict, List, Optional, Any
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, text
+from sqlalchemy import select, insert, delete
 from datetime import datetime
 import logging
+import re
 from app.models import TableMetadata, ColumnMetadata, TableType, ColumnType
 from app.database import AsyncSessionLocal
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# String spellings that mark a column as boolean
+BOOLEAN_STRINGS = pa.array(['true', 'false', '1', '0', 'yes', 'no', 't', 'f'])
+
+# Common Arrow types whose column type needs no inspection
+ARROW_TYPE_MAP: Dict[pa.DataType, ColumnType] = {
+    **{t: ColumnType.INTEGER for t in (pa.int8(), pa.int16(), pa.int32(), pa.int64(),
+                                       pa.uint8(), pa.uint16(), pa.uint32(), pa.uint64())},
+    **{t: ColumnType.FLOAT for t in (pa.float16(), pa.float32(), pa.float64())},
+    **{t: ColumnType.DATETIME for t in (pa.date32(), pa.date64(), pa.timestamp('s'),
+                                        pa.timestamp('ms'), pa.timestamp('us'), pa.timestamp('ns'))},
+    pa.bool_(): ColumnType.BOOLEAN,
+}
+
+# Stand-in sample for columns whose type follows from the schema alone
+EMPTY_SAMPLE = pa.array([], type=pa.string())
+
+# Distinct values are counted exactly up to this many per column, then estimated
+DISTINCT_EXACT_LIMIT = 100_000
+# Hashes kept by the k-minimum-values estimate; relative error is about 1/sqrt(k)
+DISTINCT_SKETCH_SIZE = 4096
+
+
+class ColumnProfile:
+    """Running statistics for one column, folded in a batch at a time"""
+    
+    def __init__(self, processor: "DataProcessor", column_name: str, arrow_type: pa.DataType):
+        self.processor = processor
+        self.column_name = column_name
+        self.arrow_type = arrow_type
+        # Type checks are resolved once from the schema, not on every batch
+        self.is_dictionary = pa.types.is_dictionary(arrow_type)
+        self.value_type = arrow_type.value_type if self.is_dictionary else arrow_type
+        self.is_string = pa.types.is_string(self.value_type)
+        self.is_null = pa.types.is_null(self.value_type)
+        # Only string columns need to see values before their type is known
+        self.column_type: Optional[ColumnType] = None if self.is_string else processor._infer_column_type(
+            arrow_type, EMPTY_SAMPLE
+        )
+        self.null_count = 0
+        # Distinct values seen so far: a de-duplicated set plus batches not yet merged into it
+        self.distinct_chunks: List[pa.Array] = []
+        self.distinct_size = 0
+        self.distinct_pending = 0
+        # Smallest distinct value hashes, replacing the exact set once it outgrows DISTINCT_EXACT_LIMIT
+        self.distinct_sketch: Optional[np.ndarray] = None
+        self.min_value = None
+        self.max_value = None
+        self.value_sum = 0
+        self.value_count = 0
+        # Cleared when a later batch no longer parses as the inferred type
+        self.stats_valid = True
+    
+    def update(self, values: pa.Array):
+        """Fold one batch of column values into the running statistics"""
+        # The null count is kept in the Arrow buffers, no scan needed
+        self.null_count += values.null_count
+        if self.is_null or values.null_count == len(values):
+            # All-empty batch, nothing to measure
+            return
+        
+        if self.is_dictionary:
+            # Dictionary-encoded: the distinct values come straight from the dictionary and used indices
+            distinct = self.processor._used_dictionary_values(values)
+        else:
+            distinct = pc.unique(values).drop_null()
+        
+        # String column types are inferred from the first batch that has values
+        if self.column_type is None:
+            self.column_type = self.processor._infer_column_type(self.arrow_type, distinct.slice(0, 100))
+        self._add_distinct(distinct)
+        
+        if not self.stats_valid:
+            return
+        
+        if self.column_type in [ColumnType.INTEGER, ColumnType.FLOAT]:
+            if self.is_dictionary:
+                # Only the row-weighted aggregates need the decoded values
+                values = values.cast(self.value_type)
+            numeric_values = self.processor._cast_or_none(values, pa.float64()) if self.is_string else values
+            if numeric_values is None:
+                self.stats_valid = False
+                return
+            stats = self.processor._aggregate(numeric_values, ['min_max', 'sum'])
+            self._add_range(stats['min_max']['min'], stats['min_max']['max'])
+            self.value_sum += stats['sum']
+            self.value_count += len(numeric_values) - numeric_values.null_count
+        elif self.column_type == ColumnType.STRING:
+            # For string columns, get min/max by length; distinct values have the same lengths as the rows
+            string_values = distinct if self.is_string else self.processor._cast_or_none(distinct, pa.string())
+            if string_values is None:
+                self.stats_valid = False
+                return
+            stats = pc.min_max(pc.utf8_length(string_values))
+            self._add_range(stats['min'].as_py(), stats['max'].as_py())
+        elif self.column_type == ColumnType.DATETIME:
+            # For datetime columns; the range of the distinct values is the range of the rows
+            datetime_values = self.processor._cast_or_none(distinct, pa.timestamp('ns')) if self.is_string else distinct
+            if datetime_values is None:
+                self.stats_valid = False
+                return
+            stats = pc.min_max(datetime_values)
+            self._add_range(stats['min'].as_py(), stats['max'].as_py())
+    
+    def _add_distinct(self, distinct: pa.Array):
+        """Collect a batch's distinct values, re-deduplicating once the pending ones outgrow the set"""
+        if self.distinct_sketch is not None:
+            self._add_to_sketch(distinct)
+            return
+        
+        self.distinct_chunks.append(distinct)
+        self.distinct_pending += len(distinct)
+        if self.distinct_pending > self.distinct_size:
+            merged = pc.unique(pa.chunked_array(self.distinct_chunks))
+            self.distinct_chunks = [merged]
+            self.distinct_size = len(merged)
+            self.distinct_pending = 0
+            if self.distinct_size > DISTINCT_EXACT_LIMIT:
+                # High-cardinality column: keep a fixed-size sketch instead of every value
+                self.distinct_sketch = np.empty(0, dtype=np.uint64)
+                self._add_to_sketch(merged)
+                self.distinct_chunks = []
+                self.distinct_size = 0
+    
+    def _add_to_sketch(self, distinct: pa.Array):
+        """Fold values into the k-minimum-values sketch of their 64-bit hashes"""
+        hashes = pd.util.hash_array(distinct.to_numpy(zero_copy_only=False))
+        # np.unique sorts, so the first k are the smallest
+        self.distinct_sketch = np.unique(np.concatenate([self.distinct_sketch, hashes]))[:DISTINCT_SKETCH_SIZE]
+    
+    def _unique_count(self) -> int:
+        """Exact distinct count, or the sketch's estimate for high-cardinality columns"""
+        if self.distinct_sketch is not None:
+            if len(self.distinct_sketch) < DISTINCT_SKETCH_SIZE:
+                return len(self.distinct_sketch)
+            # The k-th smallest of n uniform hashes sits near k / n of the hash range
+            return round((DISTINCT_SKETCH_SIZE - 1) * 2.0 ** 64 / (float(self.distinct_sketch[-1]) + 1))
+        if self.distinct_pending:
+            return len(pc.unique(pa.chunked_array(self.distinct_chunks)))
+        return self.distinct_size
+    
+    def _add_range(self, batch_min: Any, batch_max: Any):
+        """Widen the running min/max with one batch's range"""
+        if batch_min is None:
+            return
+        self.min_value = batch_min if self.min_value is None else min(self.min_value, batch_min)
+        self.max_value = batch_max if self.max_value is None else max(self.max_value, batch_max)
+    
+    def to_metadata(self) -> Dict[str, Any]:
+        """Column metadata from the statistics gathered so far"""
+        # A string column without any values stays a string
+        column_type = self.column_type or ColumnType.STRING
+        
+        unique_count = self._unique_count()
+        
+        min_value = None
+        max_value = None
+        avg_value = None
+        if self.stats_valid and self.min_value is not None:
+            min_value = str(self.min_value)
+            max_value = str(self.max_value)
+            if column_type in [ColumnType.INTEGER, ColumnType.FLOAT]:
+                avg_value = float(self.value_sum / self.value_count)
+        
+        return {
+            "column_name": self.column_name,
+            "column_type": column_type.value,  # Use string value
+            "is_nullable": self.null_count > 0,
+            "is_primary_key": False,  # Would need domain knowledge to determine
+            "is_foreign_key": False,  # Would need domain knowledge to determine
+            "null_count": int(self.null_count),
+            "unique_count": int(unique_count),
+            "min_value": min_value,
+            "max_value": max_value,
+            "avg_value": avg_value
+        }
+
 
 class DataProcessor:
     """Service for processing and analyzing datasets"""
@@ -18,15 +202,17 @@ class DataProcessor:
     def __init__(self):
         self.batch_size = settings.batch_size
         self.sample_size = settings.sample_size
+        # CSV files are parsed in blocks of this many bytes; column types come from the first block
+        self.csv_block_size = 8 << 20
+        self.executor = ThreadPoolExecutor(max_workers=settings.max_workers)
+        # Below this many columns the thread hand-off costs more than it saves
+        self.parallel_column_threshold = 4
         
     async def process_dataset(self, file_path: str, schema_name: str, table_name: str) -> Dict[str, Any]:
         """Process any dataset and extract metadata"""
         try:
-            # Read the dataset
-            df = await self._read_dataset(file_path)
-            
-            # Analyze the dataset
-            metadata = await self._analyze_dataset(df, schema_name, table_name)
+            # Open the dataset and analyze it batch by batch
+            metadata = await self._analyze_file(file_path, schema_name, table_name)
             
             # Store metadata in database
             async with AsyncSessionLocal() as session:
@@ -37,7 +223,7 @@ class DataProcessor:
             return {
                 "status": "success",
                 "table_id": str(table_metadata.id),
-                "rows_processed": len(df),
+                "rows_processed": metadata["row_count"],
                 "columns_analyzed": len(metadata["columns"]),
                 "metadata": metadata
             }
@@ -53,8 +239,32 @@ class DataProcessor:
         """Load NYC Taxi dataset and extract metadata (legacy method)"""
         return await self.process_dataset(file_path, "nyc_taxi", "yellow_taxi_trips")
     
-    async def _read_dataset(self, file_path: str) -> pd.DataFrame:
-        """Read dataset from file (CSV, Parquet, etc.)"""
+    async def _analyze_file(self, file_path: str, schema_name: str, table_name: str) -> Dict[str, Any]:
+        """Stream a dataset file through the analyzer, re-reading CSV columns whose type changes mid-file"""
+        column_types: Dict[str, pa.DataType] = {}
+        while True:
+            with await self._read_dataset(file_path, column_types) as batches:
+                try:
+                    return await self._analyze_dataset(batches, schema_name, table_name)
+                except pa.ArrowInvalid as e:
+                    # CSV column types are guessed from the first block; a column that stops matching
+                    # is read as strings instead and ColumnProfile infers its type from the values
+                    column = self._csv_conversion_column(e, batches.schema)
+                    if column is None or column in column_types:
+                        raise
+                    logger.info(f"Column {column} changes type after the first block, re-reading it as strings")
+                    column_types[column] = pa.string()
+    
+    @staticmethod
+    def _csv_conversion_column(error: pa.ArrowInvalid, schema: pa.Schema) -> Optional[str]:
+        """Name of the column a CSV conversion error refers to, if any"""
+        match = re.search(r"In CSV column #(\d+):.*conversion error", str(error))
+        if match is None or int(match.group(1)) >= len(schema):
+            return None
+        return schema.field(int(match.group(1))).name
+    
+    async def _read_dataset(self, file_path: str, column_types: Optional[Dict[str, pa.DataType]] = None) -> pa.RecordBatchReader:
+        """Open dataset file (CSV, Parquet, etc.) as a stream of Arrow record batches"""
         file_path = Path(file_path)
         
         if not file_path.exists():
@@ -62,132 +272,121 @@ class DataProcessor:
         
         # Determine file type and read accordingly
         if file_path.suffix.lower() == '.csv':
-            df = pd.read_csv(file_path)
+            # Empty strings are missing values, as they were with pandas
+            batches = pacsv.open_csv(
+                file_path,
+                read_options=pacsv.ReadOptions(block_size=self.csv_block_size),
+                convert_options=pacsv.ConvertOptions(strings_can_be_null=True, column_types=column_types)
+            )
         elif file_path.suffix.lower() in ['.parquet', '.pq']:
-            df = pd.read_parquet(file_path)
+            parquet_file = pq.ParquetFile(file_path)
+            batches = pa.RecordBatchReader.from_batches(
+                parquet_file.schema_arrow,
+                parquet_file.iter_batches(batch_size=self.batch_size)
+            )
         else:
             raise ValueError(f"Unsupported file format: {file_path.suffix}")
         
-        logger.info(f"Loaded dataset with {len(df)} rows and {len(df.columns)} columns")
-        return df
+        logger.info(f"Opened dataset with {len(batches.schema)} columns")
+        return batches
     
-    async def _analyze_dataset(self, df: pd.DataFrame, schema_name: str, table_name: str) -> Dict[str, Any]:
+    async def _analyze_dataset(self, batches: pa.RecordBatchReader, schema_name: str, table_name: str) -> Dict[str, Any]:
         """Analyze dataset and extract comprehensive metadata"""
+        profiles = [ColumnProfile(self, field.name, field.type) for field in batches.schema]
+        row_count = 0
+        size_bytes = 0
+        loop = asyncio.get_running_loop()
+        
+        # Rows are streamed a batch at a time; per column only the running statistics are kept,
+        # with distinct values bounded by DISTINCT_EXACT_LIMIT before switching to an estimate
+        for batch in batches:
+            row_count += batch.num_rows
+            size_bytes += batch.nbytes
+            # Arrow kernels release the GIL, so wide tables fan out to threads
+            if len(profiles) < self.parallel_column_threshold:
+                for profile, values in zip(profiles, batch.columns):
+                    profile.update(values)
+            else:
+                await asyncio.gather(*(
+                    loop.run_in_executor(self.executor, profile.update, values)
+                    for profile, values in zip(profiles, batch.columns)
+                ))
+        
+        logger.info(f"Analyzed dataset with {row_count} rows and {len(profiles)} columns")
         
         # Basic table information
         table_info = {
             "schema_name": schema_name,
             "table_name": table_name,
             "table_type": TableType.TABLE,  # Use enum directly
-            "row_count": len(df),
-            "size_bytes": df.memory_usage(deep=True).sum(),
+            "row_count": row_count,
+            "size_bytes": size_bytes,
             "last_analyzed": datetime.utcnow()
         }
         
-        # Analyze each column
-        columns = []
-        for col_name in df.columns:
-            column_metadata = await self._analyze_column(df, col_name)
-            columns.append(column_metadata)
-        
         return {
             **table_info,
-            "columns": columns
+            "columns": [profile.to_metadata() for profile in profiles]
         }
     
-    async def _analyze_column(self, df: pd.DataFrame, column_name: str) -> Dict[str, Any]:
-        """Analyze individual column and extract metadata"""
-        series = df[column_name]
-        
-        # Determine column type
-        column_type = self._infer_column_type(series)
-        
-        # Basic statistics
-        null_count = series.isnull().sum()
-        unique_count = series.nunique()
-        # total_count = len(series)  # Currently unused
-        
-        # Value statistics (for numeric columns)
-        min_value = None
-        max_value = None
-        avg_value = None
-        
-        if column_type in [ColumnType.INTEGER, ColumnType.FLOAT]:
-            numeric_series = pd.to_numeric(series, errors='coerce')
-            if not numeric_series.isnull().all():
-                min_value = str(numeric_series.min())
-                max_value = str(numeric_series.max())
-                avg_value = float(numeric_series.mean())
-        elif column_type == ColumnType.STRING:
-            # For string columns, get min/max by length
-            string_lengths = series.astype(str).str.len()
-            min_value = str(string_lengths.min())
-            max_value = str(string_lengths.max())
-        elif column_type == ColumnType.DATETIME:
-            # For datetime columns
-            try:
-                datetime_series = pd.to_datetime(series, errors='coerce')
-                if not datetime_series.isnull().all():
-                    min_value = str(datetime_series.min())
-                    max_value = str(datetime_series.max())
-            except Exception:
-                pass
-        
-        return {
-            "column_name": column_name,
-            "column_type": column_type.value,  # Use string value
-            "is_nullable": null_count > 0,
-            "is_primary_key": False,  # Would need domain knowledge to determine
-            "is_foreign_key": False,  # Would need domain knowledge to determine
-            "null_count": int(null_count),
-            "unique_count": int(unique_count),
-            "min_value": min_value,
-            "max_value": max_value,
-            "avg_value": avg_value
-        }
+    @staticmethod
+    def _aggregate(values: pa.Array, aggregations: List[str]) -> Dict[str, Any]:
+        """Run several aggregate kernels over a column in a single pass"""
+        result = pa.table({'value': values}).group_by([]).aggregate(
+            [('value', aggregation) for aggregation in aggregations]
+        )
+        return {aggregation: result.column(f'value_{aggregation}')[0].as_py() for aggregation in aggregations}
+    
+    @staticmethod
+    def _used_dictionary_values(values: pa.DictionaryArray) -> pa.Array:
+        """Distinct non-null values of a dictionary-encoded array, from its indices"""
+        return values.dictionary.take(pc.unique(values.indices).drop_null())
     
-    def _infer_column_type(self, series: pd.Series) -> ColumnType:
-        """Infer the appropriate column type from pandas series"""
+    @staticmethod
+    def _cast_or_none(values: pa.Array, target_type: pa.DataType) -> Optional[pa.Array]:
+        """Cast values, or return None when any value doesn't convert"""
+        try:
+            return values.cast(target_type)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            return None
+    
+    def _infer_column_type(self, arrow_type: pa.DataType, sample: pa.Array) -> ColumnType:
+        """Infer the appropriate column type from an Arrow type and a sample of its distinct values"""
+        if pa.types.is_dictionary(arrow_type):
+            arrow_type = arrow_type.value_type
+        
+        # Most columns resolve with one lookup
+        column_type = ARROW_TYPE_MAP.get(arrow_type)
+        if column_type is not None:
+            return column_type
         
         # Check for datetime
-        if pd.api.types.is_datetime64_any_dtype(series):
+        if pa.types.is_timestamp(arrow_type) or pa.types.is_date(arrow_type):
             return ColumnType.DATETIME
         
         # Check for numeric types
-        if pd.api.types.is_integer_dtype(series):
+        if pa.types.is_integer(arrow_type):
             return ColumnType.INTEGER
-        elif pd.api.types.is_float_dtype(series):
+        elif pa.types.is_floating(arrow_type):
             return ColumnType.FLOAT
-        elif pd.api.types.is_bool_dtype(series):
+        elif pa.types.is_boolean(arrow_type):
             return ColumnType.BOOLEAN
         
         # Try to infer from string content
-        if pd.api.types.is_object_dtype(series):
-            # Sample a few values to check patterns
-            sample = series.dropna().head(100)
-            
-            # Check if it looks like datetime
-            try:
-                pd.to_datetime(sample, errors='raise')
+        if pa.types.is_string(arrow_type) and len(sample) > 0:
+            # Check if it looks like datetime (ISO 8601, as Arrow casts strings)
+            if self._cast_or_none(sample, pa.timestamp('ns')) is not None:
                 return ColumnType.DATETIME
-            except Exception:
-                pass
             
-            # Check if it looks like numeric
-            try:
-                pd.to_numeric(sample, errors='raise')
-                # Check if all are integers
-                numeric_sample = pd.to_numeric(sample)
-                if all(numeric_sample == numeric_sample.astype(int)):
+            # Check if it looks like numeric; integral floats such as "3.0" count as integers
+            numeric_sample = self._cast_or_none(sample, pa.float64())
+            if numeric_sample is not None:
+                if pc.all(pc.equal(numeric_sample, pc.trunc(numeric_sample))).as_py():
                     return ColumnType.INTEGER
-                else:
-                    return ColumnType.FLOAT
-            except Exception:
-                pass
+                return ColumnType.FLOAT
             
             # Check if it looks like boolean
-            unique_values = set(str(v).lower() for v in sample.unique())
-            if unique_values.issubset({'true', 'false', '1', '0', 'yes', 'no', 't', 'f'}):
+            if pc.all(pc.is_in(pc.utf8_lower(sample), value_set=BOOLEAN_STRINGS)).as_py():
                 return ColumnType.BOOLEAN
         
         # Default to string
@@ -229,17 +428,15 @@ class DataProcessor:
         
         # Delete existing column metadata for this table
         await session.execute(
-            text("DELETE FROM catalog.column_metadata WHERE table_id = :table_id"),
-            {"table_id": table_id}
+            delete(ColumnMetadata).where(ColumnMetadata.table_id == table_id)
         )
         
-        # Insert new column metadata
-        for col_data in columns:
-            column_metadata = ColumnMetadata(
-                table_id=table_id,
-                **col_data
+        # Insert new column metadata in one multi-row INSERT, without building ORM objects
+        if columns:
+            await session.execute(
+                insert(ColumnMetadata),
+                [{"table_id": table_id, **col_data} for col_data in columns]
             )
-            session.add(column_metadata)
     
     async def get_dataset_profile(self, schema_name: str, table_name: str) -> Optional[Dict[str, Any]]:
         """Get comprehensive profile of a dataset"""
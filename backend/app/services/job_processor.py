@@ -1,17 +1,24 @@
-import json
+import orjson
 import asyncio
 import logging
 import uuid
+import time
 from typing import Dict, Any, Callable, Optional
-from datetime import datetime, timedelta
 from enum import Enum
-import numpy as np
 import traceback
 from app.database import get_redis
-# from app.config import settings  # Will be used for configuration
+from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Sorted set of job ids per status, scored by the time the job entered it
+STATUS_INDEX_KEY = "jobs_by_status:{}"
+
+
+def now_ms() -> int:
+    """Current time as integer epoch milliseconds"""
+    return int(time.time() * 1000)
+
 
 class JobStatus(str, Enum):
     PENDING = "pending"
@@ -21,12 +28,112 @@ class JobStatus(str, Enum):
     CANCELLED = "cancelled"
 
 
+class JobSubmitter:
+    """Coalesces job submissions into pipelined Redis batches"""
+    
+    def __init__(self, processor: "JobProcessor", max_batch_size: int = 100, max_wait: float = 0.005):
+        self.processor = processor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    async def enqueue(self, job: Dict[str, Any], priority: int) -> str:
+        """Queue a job for the next batch and wait until it has been stored"""
+        if self._task is None or self._task.done():
+            self.queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+        
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((job, priority, future))
+        return await future
+    
+    async def stop(self):
+        """Stop the batching task, cancelling any submissions it has not stored yet"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if self.queue is not None:
+            self._abandon(self.queue, [], None)
+    
+    def _abandon(self, queue: asyncio.Queue, batch: list, error: Optional[BaseException]):
+        """Resolve every submission still waiting in the batch or the queue, so no caller hangs"""
+        pending = list(batch)
+        while not queue.empty():
+            pending.append(queue.get_nowait())
+        for _, _, future in pending:
+            if future.done():
+                continue
+            if error is None:
+                future.cancel()
+            else:
+                future.set_exception(error)
+    
+    async def _next_batch(self, queue: asyncio.Queue, batch: list):
+        """Wait for one submission, then gather more until the batch is full or max_wait elapses"""
+        loop = asyncio.get_running_loop()
+        batch.append(await queue.get())
+        deadline = loop.time() + self.max_wait
+        
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+    
+    async def _run(self):
+        """Write each batch of submissions with a single pipelined round-trip"""
+        queue = self.queue
+        batch = []
+        error: Optional[BaseException] = None
+        try:
+            while True:
+                # Filled in place, so submissions already taken off the queue are not lost on cancel
+                batch = []
+                await self._next_batch(queue, batch)
+                try:
+                    pipe = self.processor.redis_client.pipeline(transaction=False)
+                    for job, priority, _ in batch:
+                        # Store job details as one blob, and the fields that change in a small side hash
+                        pipe.set(f"job:{job['id']}", self.processor._encode(job))
+                        pipe.hset(f"job_state:{job['id']}", mapping={
+                            "status": JobStatus.PENDING.value,
+                            "progress": 0
+                        })
+                        # Add to job queue with priority
+                        pipe.zadd("job_queue", {job["id"]: priority})
+                        self.processor._index_status(pipe, job["id"], JobStatus.PENDING)
+                    await pipe.execute()
+                except Exception as e:
+                    for _, _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                else:
+                    for job, _, future in batch:
+                        if not future.done():
+                            future.set_result(job["id"])
+        except Exception as e:
+            # The next enqueue starts a fresh task
+            logger.error(f"Job submitter stopped: {str(e)}")
+            error = e
+        finally:
+            self._abandon(queue, batch, error)
+
+
 class JobProcessor:
     """Background job processor using Redis"""
     
     def __init__(self):
         self.handlers: Dict[str, Callable] = {}
         self.redis_client = None
+        self.submitter = JobSubmitter(self)
         
     async def initialize(self):
         """Initialize Redis connection"""
@@ -36,19 +143,25 @@ class JobProcessor:
         """Register a job handler for a specific job type"""
         self.handlers[job_type] = handler
     
-    def _json_serializer(self, obj):
-        """Custom JSON serializer for numpy/pandas/datetime types"""
-        if isinstance(obj, (np.integer, np.int64)):
-            return int(obj)
-        elif isinstance(obj, (np.floating, np.float64)):
-            return float(obj)
-        elif isinstance(obj, np.ndarray):
-            return obj.tolist()
-        elif isinstance(obj, datetime):
-            return obj.isoformat()
-        elif hasattr(obj, 'item'):  # pandas scalars
-            return obj.item()
-        raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
+    def _index_status(self, pipe, job_id: str, new_status: JobStatus, *old_statuses: JobStatus):
+        """Queue a job's move between the per-status index sets onto a pipeline"""
+        for old_status in old_statuses:
+            pipe.zrem(STATUS_INDEX_KEY.format(old_status.value), job_id)
+        pipe.zadd(STATUS_INDEX_KEY.format(new_status.value), {job_id: now_ms()})
+    
+    def _expire_job(self, pipe, job_id: str):
+        """Queue expiry of a finished job's keys onto a pipeline"""
+        pipe.expire(f"job:{job_id}", settings.finished_job_ttl)
+        pipe.expire(f"job_state:{job_id}", settings.finished_job_ttl)
+    
+    def _encode(self, value: Any) -> bytes:
+        """Serialize a job payload for Redis"""
+        # numpy scalars/arrays, datetimes and enums are all handled natively in orjson
+        return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC)
+    
+    def _decode(self, value: str) -> Any:
+        """Deserialize a job payload read from Redis"""
+        return orjson.loads(value)
     
     async def submit_job(self, job_type: str, job_data: Dict[str, Any], priority: int = 0) -> str:
         """Submit a job for background processing"""
@@ -60,24 +173,12 @@ class JobProcessor:
             "id": job_id,
             "type": job_type,
             "data": job_data,
-            "status": JobStatus.PENDING.value,
             "priority": priority,
-            "created_at": datetime.utcnow().isoformat(),
-            "started_at": None,
-            "completed_at": None,
-            "result": None,
-            "error": None,
-            "progress": 0
+            "created_at": now_ms()
         }
         
-        # Store job details
-        await self.redis_client.hset(f"job:{job_id}", mapping={
-            k: json.dumps(v) if isinstance(v, (dict, list)) else str(v)
-            for k, v in job.items()
-        })
-        
-        # Add to job queue with priority
-        await self.redis_client.zadd("job_queue", {job_id: priority})
+        # Stored and queued together with other submissions in the same batch
+        await self.submitter.enqueue(job, priority)
         
         logger.info(f"Submitted job {job_id} of type {job_type}")
         return job_id
@@ -87,27 +188,23 @@ class JobProcessor:
         if not self.redis_client:
             await self.initialize()
         
-        job_data = await self.redis_client.hgetall(f"job:{job_id}")
-        if not job_data:
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.get(f"job:{job_id}")
+        pipe.hgetall(f"job_state:{job_id}")
+        job_blob, job_state = await pipe.execute()
+        if not job_blob:
             return None
         
-        # Parse JSON fields
-        for key in ["data", "result"]:
-            if key in job_data and job_data[key] and job_data[key] != 'None':
-                try:
-                    job_data[key] = json.loads(job_data[key])
-                except json.JSONDecodeError:
-                    pass
-            elif key in job_data and (job_data[key] == 'None' or not job_data[key]):
-                job_data[key] = None
-        
-        # Convert numeric fields
-        if "progress" in job_data:
-            job_data["progress"] = float(job_data["progress"])
-        if "priority" in job_data:
-            job_data["priority"] = int(job_data["priority"])
+        # Fixed fields come from the blob, everything that changes while the job runs from the state hash
+        job = self._decode(job_blob)
+        job.update(job_state)
+        job["progress"] = float(job_state.get("progress", 0))
+        job["result"] = self._decode(job_state["result"]) if "result" in job_state else None
+        for key in ["started_at", "completed_at"]:
+            job[key] = int(job_state[key]) if key in job_state else None
+        job.setdefault("error", None)
         
-        return job_data
+        return job
     
     async def update_job_progress(self, job_id: str, progress: float, message: str = None):
         """Update job progress"""
@@ -118,7 +215,7 @@ class JobProcessor:
         if message:
             updates["message"] = message
         
-        await self.redis_client.hmset(f"job:{job_id}", updates)
+        await self.redis_client.hset(f"job_state:{job_id}", mapping=updates)
     
     async def cancel_job(self, job_id: str) -> bool:
         """Cancel a pending or running job"""
@@ -130,15 +227,19 @@ class JobProcessor:
             return False
         
         if job["status"] in [JobStatus.PENDING.value, JobStatus.RUNNING.value]:
-            await self.redis_client.hmset(f"job:{job_id}", {
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.hset(f"job_state:{job_id}", mapping={
                 "status": JobStatus.CANCELLED.value,
-                "completed_at": datetime.utcnow().isoformat()
+                "completed_at": now_ms()
             })
             
             # Remove from queue if pending
             if job["status"] == JobStatus.PENDING.value:
-                await self.redis_client.zrem("job_queue", job_id)
+                pipe.zrem("job_queue", job_id)
+            self._index_status(pipe, job_id, JobStatus.CANCELLED, JobStatus(job["status"]))
+            self._expire_job(pipe, job_id)
             
+            await pipe.execute()
             return True
         
         return False
@@ -152,17 +253,12 @@ class JobProcessor:
         
         while True:
             try:
-                # Get highest priority job
-                jobs = await self.redis_client.zrevrange("job_queue", 0, 0, withscores=True)
-                
-                if not jobs:
-                    await asyncio.sleep(1)
+                # Atomically take the highest priority job, blocking until one arrives
+                popped = await self.redis_client.bzpopmax("job_queue", timeout=5)
+                if not popped:
                     continue
                 
-                job_id = jobs[0][0]
-                
-                # Remove from queue
-                await self.redis_client.zrem("job_queue", job_id)
+                _, job_id, _ = popped
                 
                 # Process the job
                 await self._process_single_job(job_id)
@@ -184,10 +280,13 @@ class JobProcessor:
                 return
             
             # Mark as running
-            await self.redis_client.hmset(f"job:{job_id}", {
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.hset(f"job_state:{job_id}", mapping={
                 "status": JobStatus.RUNNING.value,
-                "started_at": datetime.utcnow().isoformat()
+                "started_at": now_ms()
             })
+            self._index_status(pipe, job_id, JobStatus.RUNNING, JobStatus.PENDING)
+            await pipe.execute()
             
             # Get handler
             handler = self.handlers.get(job["type"])
@@ -200,12 +299,16 @@ class JobProcessor:
             result = await handler(job_id, job["data"])
             
             # Mark as completed
-            await self.redis_client.hmset(f"job:{job_id}", {
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.hset(f"job_state:{job_id}", mapping={
                 "status": JobStatus.COMPLETED.value,
-                "completed_at": datetime.utcnow().isoformat(),
-                "result": json.dumps(result, default=self._json_serializer),
+                "completed_at": now_ms(),
+                "result": self._encode(result),
                 "progress": "100"
             })
+            self._index_status(pipe, job_id, JobStatus.COMPLETED, JobStatus.RUNNING)
+            self._expire_job(pipe, job_id)
+            await pipe.execute()
             
             logger.info(f"Completed job {job_id}")
             
@@ -213,58 +316,63 @@ class JobProcessor:
             logger.error(f"Error processing job {job_id}: {str(e)}")
             
             # Mark as failed
-            await self.redis_client.hmset(f"job:{job_id}", {
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.hset(f"job_state:{job_id}", mapping={
                 "status": JobStatus.FAILED.value,
-                "completed_at": datetime.utcnow().isoformat(),
+                "completed_at": now_ms(),
                 "error": str(e),
                 "traceback": traceback.format_exc()
             })
+            self._index_status(pipe, job_id, JobStatus.FAILED, JobStatus.PENDING, JobStatus.RUNNING)
+            self._expire_job(pipe, job_id)
+            await pipe.execute()
     
     async def cleanup_old_jobs(self, max_age_hours: int = 24):
         """Clean up old completed/failed jobs"""
         if not self.redis_client:
             await self.initialize()
         
-        cutoff_time = datetime.utcnow() - timedelta(hours=max_age_hours)
+        cutoff_ms = now_ms() - max_age_hours * 3_600_000
+        finished = [JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED]
         
-        # Get all job keys
-        job_keys = await self.redis_client.keys("job:*")
+        # The status indexes are scored by finish time, so stale jobs are a range query
+        pipe = self.redis_client.pipeline(transaction=False)
+        for status in finished:
+            pipe.zrangebyscore(STATUS_INDEX_KEY.format(status.value), "-inf", cutoff_ms)
+        stale_by_status = await pipe.execute()
         
-        for job_key in job_keys:
-            job_data = await self.redis_client.hgetall(job_key)
-            
-            if job_data.get("status") in [JobStatus.COMPLETED.value, JobStatus.FAILED.value, JobStatus.CANCELLED.value]:
-                completed_at = job_data.get("completed_at")
-                if completed_at:
-                    try:
-                        completed_time = datetime.fromisoformat(completed_at)
-                        if completed_time < cutoff_time:
-                            await self.redis_client.delete(job_key)
-                            logger.info(f"Cleaned up old job: {job_key}")
-                    except ValueError:
-                        pass
+        # Finished job keys normally expire on their own; this prunes the indexes and any key left without a TTL
+        pipe = self.redis_client.pipeline(transaction=False)
+        stale_count = 0
+        for status, job_ids in zip(finished, stale_by_status):
+            if job_ids:
+                pipe.delete(*(f"job:{job_id}" for job_id in job_ids))
+                pipe.delete(*(f"job_state:{job_id}" for job_id in job_ids))
+                pipe.zrem(STATUS_INDEX_KEY.format(status.value), *job_ids)
+                stale_count += len(job_ids)
+        
+        if stale_count:
+            await pipe.execute()
+            logger.info(f"Cleaned up {stale_count} old jobs")
     
     async def get_job_queue_stats(self) -> Dict[str, Any]:
         """Get statistics about the job queue"""
         if not self.redis_client:
             await self.initialize()
         
-        # Count jobs by status
-        job_keys = await self.redis_client.keys("job:*")
-        status_counts = {status.value: 0 for status in JobStatus}
-        
-        for job_key in job_keys:
-            status = await self.redis_client.hget(job_key, "status")
-            if status in status_counts:
-                status_counts[status] += 1
+        # Count jobs by status, and the queue length, in one round-trip
+        pipe = self.redis_client.pipeline(transaction=False)
+        for status in JobStatus:
+            pipe.zcard(STATUS_INDEX_KEY.format(status.value))
+        pipe.zcard("job_queue")
+        *counts, queue_length = await pipe.execute()
         
-        # Queue length
-        queue_length = await self.redis_client.zcard("job_queue")
+        status_counts = {status.value: count for status, count in zip(JobStatus, counts)}
         
         return {
             "queue_length": queue_length,
             "status_counts": status_counts,
-            "total_jobs": len(job_keys)
+            "total_jobs": sum(counts)
         }
 
 
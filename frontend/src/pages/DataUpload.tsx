@@ -68,7 +68,7 @@ const DataUpload: React.FC = () => {
           type: 'process_dataset',
           status: 'pending',
           progress: 0,
-          created_at: new Date().toISOString(),
+          created_at: Date.now(),
         }
       };
       
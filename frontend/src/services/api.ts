@@ -5,9 +5,9 @@ export interface JobStatus {
   type: string;
   status: 'pending' | 'running' | 'completed' | 'failed';
   progress: number;
-  created_at: string;
-  started_at?: string;
-  completed_at?: string;
+  created_at: number;  // epoch milliseconds
+  started_at?: number;
+  completed_at?: number;
   result?: any;
   error?: string;
 }
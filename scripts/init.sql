@@ -4,6 +4,7 @@
 -- Enable required extensions
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 CREATE EXTENSION IF NOT EXISTS "pg_stat_statements";
+CREATE EXTENSION IF NOT EXISTS "pg_trgm";
 
 -- Create schemas
 CREATE SCHEMA IF NOT EXISTS catalog;
@@ -65,14 +66,31 @@ CREATE TABLE IF NOT EXISTS lineage.table_relationships (
     UNIQUE(source_table_id, target_table_id, relationship_type)
 );
 
+CREATE TABLE IF NOT EXISTS catalog.settings (
+    id SERIAL PRIMARY KEY,
+    category VARCHAR(50) NOT NULL,
+    key VARCHAR(100) NOT NULL,
+    value TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT NOW(),
+    UNIQUE(category, key)
+);
+
 -- Create indexes for performance
 CREATE INDEX IF NOT EXISTS idx_table_metadata_schema_table ON catalog.table_metadata(schema_name, table_name);
 CREATE INDEX IF NOT EXISTS idx_table_metadata_type ON catalog.table_metadata(table_type);
 CREATE INDEX IF NOT EXISTS idx_table_metadata_updated ON catalog.table_metadata(updated_at);
+-- Analytics dashboard: top tables by size and recent activity (match the ORDER BY of each query)
+CREATE INDEX IF NOT EXISTS idx_table_metadata_size_rows ON catalog.table_metadata(size_bytes DESC NULLS LAST, row_count DESC NULLS LAST) INCLUDE (schema_name, table_name, updated_at, created_at);
+CREATE INDEX IF NOT EXISTS idx_table_metadata_activity ON catalog.table_metadata((COALESCE(updated_at, created_at)) DESC) INCLUDE (schema_name, table_name);
+-- Catalog search: trigram indexes serve the ILIKE '%term%' predicates
+CREATE INDEX IF NOT EXISTS idx_table_metadata_name_trgm ON catalog.table_metadata USING gin (table_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_table_metadata_description_trgm ON catalog.table_metadata USING gin (description gin_trgm_ops);
 
 CREATE INDEX IF NOT EXISTS idx_column_metadata_table_id ON catalog.column_metadata(table_id);
 CREATE INDEX IF NOT EXISTS idx_column_metadata_name ON catalog.column_metadata(column_name);
 CREATE INDEX IF NOT EXISTS idx_column_metadata_type ON catalog.column_metadata(column_type);
+CREATE INDEX IF NOT EXISTS idx_column_metadata_name_trgm ON catalog.column_metadata USING gin (column_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_column_metadata_description_trgm ON catalog.column_metadata USING gin (description gin_trgm_ops);
 
 CREATE INDEX IF NOT EXISTS idx_relationships_source ON lineage.table_relationships(source_table_id);
 CREATE INDEX IF NOT EXISTS idx_relationships_target ON lineage.table_relationships(target_table_id);